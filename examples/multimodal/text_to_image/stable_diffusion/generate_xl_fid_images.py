@@ -12,11 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import itertools
+import json
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import numpy as np
 import torch
-from einops import rearrange
 from omegaconf.omegaconf import open_dict
 from PIL import Image
 
@@ -25,6 +29,13 @@ from nemo.collections.multimodal.parts.stable_diffusion.sdxl_pipeline import Sam
 from nemo.collections.multimodal.parts.utils import setup_trainer_and_model_for_inference
 from nemo.core.config import hydra_runner
 
+try:
+    from nvidia import nvimgcodec
+
+    HAVE_NVIMGCODEC = True
+except (ImportError, ModuleNotFoundError):
+    HAVE_NVIMGCODEC = False
+
 
 @hydra_runner(config_path='conf/stable_diffusion/conf', config_name='sd_xl_fid_images')
 def main(cfg):
@@ -46,27 +57,60 @@ def main(cfg):
             cfg.sampling.refiner.scale = current_node_cfg
     save_path = os.path.join(cfg.fid.save_path, str(current_node_cfg))
 
-    # Read and store captions
-    captions = []
-    caption_files = sorted(os.listdir(path))
-    assert len(caption_files) >= num_images_to_eval
-    for file in caption_files[:num_images_to_eval]:
-        with open(os.path.join(path, file), 'r') as f:
-            captions += f.readlines()
-
     # Calculate partition sizes and select the partition for the current node
     partition_size_per_node = num_images_to_eval // nnodes_per_cfg
-    start_idx = node_id_per_cfg * partition_size_per_node
-    end_idx = (node_id_per_cfg + 1) * partition_size_per_node if node_id_per_cfg != nnodes_per_cfg - 1 else None
-    captions = captions[start_idx:end_idx]
+    node_start_idx = node_id_per_cfg * partition_size_per_node
+    node_end_idx = (
+        (node_id_per_cfg + 1) * partition_size_per_node if node_id_per_cfg != nnodes_per_cfg - 1 else num_images_to_eval
+    )
 
     local_task_id = int(local_task_id) if local_task_id is not None else int(os.environ.get("SLURM_LOCALID", 0))
-    partition_size_per_task = int(len(captions) // ntasks_per_node)
+    partition_size_per_task = int((node_end_idx - node_start_idx) // ntasks_per_node)
 
     # Select the partition for the current task
-    start_idx = local_task_id * partition_size_per_task
-    end_idx = (local_task_id + 1) * partition_size_per_task if local_task_id != ntasks_per_node - 1 else None
-    input = captions[start_idx:end_idx]
+    start_idx = node_start_idx + local_task_id * partition_size_per_task
+    end_idx = (
+        node_start_idx + (local_task_id + 1) * partition_size_per_task
+        if local_task_id != ntasks_per_node - 1
+        else node_end_idx
+    )
+
+    # List the caption directory once per node and share the sorted index through
+    # node-local tmp, instead of every task stampeding the shared filesystem.
+    # Key the file by job id *and* caption path so a leftover index from a
+    # previous run (or a concurrent run against another caption set) is never
+    # silently reused.
+    index_key = hashlib.sha1(path.encode()).hexdigest()[:16]
+    index_file = os.path.join(
+        tempfile.gettempdir(), f"caption_index_{os.environ.get('SLURM_JOB_ID', '0')}_{index_key}.json"
+    )
+    if local_task_id == 0:
+        caption_files = sorted(os.listdir(path))
+        with open(index_file + ".tmp", 'w') as f:
+            json.dump(caption_files, f)
+        os.replace(index_file + ".tmp", index_file)
+    else:
+        # don't wait forever on task 0; fall back to listing the directory
+        # ourselves if the index never shows up
+        deadline = time.monotonic() + 120
+        while not os.path.exists(index_file) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if os.path.exists(index_file):
+            with open(index_file, 'r') as f:
+                caption_files = json.load(f)
+        else:
+            caption_files = sorted(os.listdir(path))
+    assert len(caption_files) >= num_images_to_eval
+
+    # Read and store only this worker's captions, so each rank opens just its own slice of files;
+    # caption files are tiny, so threads hide the per-file metadata latency of networked filesystems
+
+    def read_captions(file):
+        with open(os.path.join(path, file), 'r') as f:
+            return [line.rstrip('\n') for line in f]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        input = list(itertools.chain.from_iterable(executor.map(read_captions, caption_files[start_idx:end_idx])))
 
     print(f"Current worker {node_id}:{local_task_id} will generate {len(input)} images")
 
@@ -93,17 +137,33 @@ def main(cfg):
     model.cuda().eval()
     base = SamplingPipeline(model, use_fp16=cfg.use_fp16, is_legacy=cfg.model.is_legacy)
 
+    # Compile the UNet with CUDA graphs; the denoising loop dominates sampling time
+    base.model.model.diffusion_model.to(memory_format=torch.channels_last)
+    base.model.model.diffusion_model = torch.compile(
+        base.model.model.diffusion_model, mode="reduce-overhead", fullgraph=True
+    )
+
     if use_refiner:
         refiner_config = cfg.refiner_config
         refiner = SamplingPipeline(refiner_config, use_fp16=cfg.use_fp16)
+        refiner.model.model.diffusion_model.to(memory_format=torch.channels_last)
+        refiner.model.model.diffusion_model = torch.compile(
+            refiner.model.model.diffusion_model, mode="reduce-overhead", fullgraph=True
+        )
+
+    # GPU-side PNG encoding keeps libpng off the critical CPU thread; PIL stays
+    # the portable default
+    encoder = nvimgcodec.Encoder() if HAVE_NVIMGCODEC and cfg.infer.get('use_nvimgcodec', False) else None
 
     # Generate images using the model and save them
-    for i, prompt in enumerate(input):
-        cfg.infer.prompt = [prompt]
+    # Batch prompts so each sampling call runs one batched UNet pass instead of one per prompt
+    batch_size = cfg.infer.get('batch_size', 8)
+    for i in range(0, len(input), batch_size):
+        chunk = input[i : i + batch_size]
         seed = int(cfg.infer.seed + local_task_id * 10 + node_id_per_cfg * 100 + i * 1000)
         output = base.text_to_image(
             params=cfg.sampling.base,
-            prompt=cfg.infer.prompt,
+            prompt=chunk,
             negative_prompt=cfg.infer.negative_prompt,
             samples=cfg.infer.num_samples,
             return_latents=True if use_refiner else False,
@@ -121,17 +181,25 @@ def main(cfg):
             output = refiner.refiner(
                 params=cfg.sampling.refiner,
                 image=samples_z,
-                prompt=cfg.infer.prompt,
+                prompt=chunk,
                 negative_prompt=cfg.infer.negative_prompt,
                 samples=cfg.infer.num_samples,
                 seed=cfg.infer.seed,
             )
 
-        for sample in output:
-            image_num = i + partition_size_per_node * node_id_per_cfg + partition_size_per_task * local_task_id
-            sample = 255.0 * rearrange(sample.cpu().numpy(), "c h w -> h w c")
-            image = Image.fromarray(sample.astype(np.uint8))
-            image.save(os.path.join(save_path, f'image{image_num:06d}.png'))
+        for j, sample in enumerate(output):
+            image_num = i + j + partition_size_per_node * node_id_per_cfg + partition_size_per_task * local_task_id
+            # Scale, cast and permute on GPU so only uint8 HWC bytes cross PCIe
+            sample = sample.clamp(0, 1).mul(255).to(torch.uint8).permute(1, 2, 0).contiguous()
+            image_path = os.path.join(save_path, f'image{image_num:06d}.png')
+            if encoder is not None:
+                # nvImageCodec consumes the device tensor via __cuda_array_interface__
+                with open(image_path, 'wb') as f:
+                    f.write(encoder.encode(nvimgcodec.as_image(sample), "png"))
+            else:
+                image = Image.fromarray(sample.cpu().numpy())
+                # File size is irrelevant for FID eval, so trade compression for encode speed
+                image.save(image_path, compress_level=1)
 
 
 if __name__ == "__main__":
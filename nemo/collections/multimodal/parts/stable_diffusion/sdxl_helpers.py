@@ -92,7 +92,11 @@ def do_sample(
     with torch.no_grad():
         with autocast(device) as precision_scope:
             with model.ema_scope():
-                num_samples = [num_samples]
+                if isinstance(value_dict.get("prompt"), (list, tuple)):
+                    # one latent per prompt per requested sample
+                    num_samples = [num_samples * len(value_dict["prompt"])]
+                else:
+                    num_samples = [num_samples]
                 batch, batch_uc = get_batch(
                     get_unique_embedder_keys_from_conditioner(model.conditioner), value_dict, num_samples,
                 )
@@ -133,6 +137,14 @@ def do_sample(
                 return samples
 
 
+def _expand_prompts(value, N):
+    # accept either a single prompt for the whole batch or one prompt per
+    # batch entry group; each prompt is repeated to fill its share of N
+    if isinstance(value, (list, tuple)):
+        return np.repeat(value, repeats=math.prod(N) // len(value)).reshape(N).tolist()
+    return np.repeat([value], repeats=math.prod(N)).reshape(N).tolist()
+
+
 def get_batch(keys, value_dict, N: Union[List, ListConfig], device="cuda"):
     # Hardcoded demo setups; might undergo some changes in the future
 
@@ -141,11 +153,11 @@ def get_batch(keys, value_dict, N: Union[List, ListConfig], device="cuda"):
 
     for key in keys:
         if key == "txt":
-            batch["txt"] = np.repeat([value_dict["prompt"]], repeats=math.prod(N)).reshape(N).tolist()
-            batch_uc["txt"] = np.repeat([value_dict["negative_prompt"]], repeats=math.prod(N)).reshape(N).tolist()
+            batch["txt"] = _expand_prompts(value_dict["prompt"], N)
+            batch_uc["txt"] = _expand_prompts(value_dict["negative_prompt"], N)
         elif key == "captions":
-            batch["captions"] = np.repeat([value_dict["prompt"]], repeats=math.prod(N)).reshape(N).tolist()
-            batch_uc["captions"] = np.repeat([value_dict["negative_prompt"]], repeats=math.prod(N)).reshape(N).tolist()
+            batch["captions"] = _expand_prompts(value_dict["prompt"], N)
+            batch_uc["captions"] = _expand_prompts(value_dict["negative_prompt"], N)
         elif key == "original_size_as_tuple":
             batch["original_size_as_tuple"] = (
                 torch.tensor([value_dict["orig_height"], value_dict["orig_width"]]).to(device).repeat(*N, 1)
@@ -204,6 +216,10 @@ def do_img2img(
     with torch.no_grad():
         with autocast(device) as precision_scope:
             with model.ema_scope():
+                if isinstance(value_dict.get("prompt"), (list, tuple)):
+                    # conditioning batch must line up with the input latents,
+                    # one group of samples per prompt
+                    num_samples = num_samples * len(value_dict["prompt"])
                 batch, batch_uc = get_batch(
                     get_unique_embedder_keys_from_conditioner(model.conditioner), value_dict, [num_samples],
                 )
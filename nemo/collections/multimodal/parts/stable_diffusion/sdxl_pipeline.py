@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Optional
+from typing import List, Optional, Union
 
 from omegaconf import OmegaConf
 
@@ -44,7 +44,7 @@ class SamplingPipeline:
     def text_to_image(
         self,
         params,
-        prompt: str,
+        prompt: Union[str, List[str]],
         negative_prompt: str = "",
         samples: int = 1,
         return_latents: bool = False,
@@ -75,7 +75,7 @@ class SamplingPipeline:
         self,
         params,
         image,
-        prompt: str,
+        prompt: Union[str, List[str]],
         negative_prompt: str = "",
         samples: int = 1,
         return_latents: bool = False,
@@ -109,7 +109,7 @@ class SamplingPipeline:
         self,
         params,
         image,
-        prompt: str,
+        prompt: Union[str, List[str]],
         negative_prompt: Optional[str] = None,
         samples: int = 1,
         return_latents: bool = False,
@@ -173,8 +173,9 @@ class RetroQAFineTuneDataset(Dataset):
     def collate_fn(self, batch, tp_workers=0):
         """ Prepares input_ids, labels, loss mask, attention_mask, and position ids for global batch """
         input_ids, answer_starts, chunks = zip(*batch)
-        # convert chunks into torch tensors
-        chunks = torch.tensor(chunks)
+        # chunks are pre-padded [1, K, r] arrays; stack them in C instead of
+        # letting torch.tensor walk the nested Python sequence
+        chunks = torch.from_numpy(np.stack(chunks))
 
         # Get max sequence length of batch
         batch_max = max(len(ids) for ids in input_ids)
@@ -210,27 +211,18 @@ class RetroQAFineTuneDataset(Dataset):
 
     def pad_batch_and_build_loss_mask(self, input_ids, batch_max, answer_starts):
         """ Pad input_ids in batch to max batch length while building loss mask """
-        batch_loss_masks = []
-        padded_input_ids = []
-        for ids, answer_start_idx in zip(input_ids, answer_starts):
+        # write each sample into preallocated arrays instead of building
+        # per-token Python lists; padding positions keep pad id / 0.0 mask
+        padded_input_ids = np.full((len(input_ids), batch_max), self.pad_token_id, dtype=np.int64)
+        batch_loss_masks = np.zeros((len(input_ids), batch_max), dtype=np.float32)
+        for i, (ids, answer_start_idx) in enumerate(zip(input_ids, answer_starts)):
+            input_length = len(ids)
+            padded_input_ids[i, :input_length] = ids
             if self.answer_only_loss and answer_start_idx is not None:
                 # Loss mask where answer tokens are 1.0 and all other tokens are 0.0
-                loss_mask = [float(idx >= answer_start_idx) for idx in range(len(ids))]
+                batch_loss_masks[i, answer_start_idx:input_length] = 1.0
             else:
                 # Loss mask where virtual tokens are 0.0 and all other tokens are 1.0
-                loss_mask = [1.0] * len(ids)
-            # Pad to max length
-            input_length = len(ids)
-            padding_length = batch_max - input_length
-            ids = ids + [self.pad_token_id] * padding_length
-            padded_input_ids.append(ids)
-
-            # Account for padding in loss mask
-            loss_mask.extend([0.0] * padding_length)
-            batch_loss_masks.append(torch.tensor(loss_mask, dtype=torch.float))
-
-        # Make into torch tensors
-        padded_input_ids = torch.tensor(padded_input_ids, dtype=torch.long)
-        batch_loss_masks = torch.stack(batch_loss_masks)
+                batch_loss_masks[i, :input_length] = 1.0
 
-        return padded_input_ids, batch_loss_masks
+        return torch.from_numpy(padded_input_ids), torch.from_numpy(batch_loss_masks)
@@ -438,6 +438,14 @@ class MegatronBaseModel(NLPModel):
     def on_train_start(self) -> None:
         super().on_train_start()
         self.init_global_step = self.trainer.global_step
+        # resolve the fp16 grad scaler once; on_train_batch_end runs per micro-batch
+        # and the isinstance probing there is pure overhead on bf16/fp32 runs
+        self._fp16_grad_scaler = None
+        precision_plugin = self.trainer.precision_plugin
+        if precision_plugin is not None and isinstance(precision_plugin, MixedPrecisionPlugin):
+            scaler = getattr(precision_plugin, 'scaler', None)
+            if scaler is not None and isinstance(scaler, GradScaler):
+                self._fp16_grad_scaler = scaler
 
     def on_validation_start(self) -> None:
         super().on_validation_start()
@@ -688,38 +696,28 @@ class MegatronBaseModel(NLPModel):
 
         # TODO: Replace with newer override for scheduler.step() instead of
         # search for plugins for fp16 GradScalar
-        if self.trainer.precision_plugin is not None and isinstance(
-            self.trainer.precision_plugin, MixedPrecisionPlugin
-        ):
-            precision_plugin = self.trainer.precision_plugin
-
-            if (
-                hasattr(precision_plugin, 'scaler')
-                and precision_plugin.scaler is not None
-                and isinstance(precision_plugin.scaler, GradScaler)
-            ):
-                grad_scaler = precision_plugin.scaler
-
-                # If the grad scaler skipped its optimizer step due to infs/nans,
-                # decrement the step of all schedulers.
-                if grad_scaler.optimizer_update_skipped is not None and grad_scaler.optimizer_update_skipped is True:
-                    scheduler_cfgs = self.trainer.lr_scheduler_configs
-
-                    if not scheduler_cfgs or not self.trainer.lightning_module.automatic_optimization:
-                        return
-
-                    for scheduler_cfg in scheduler_cfgs:
-                        # Decrement the counter by 2, then perform a scheduler.step() to perform a no-up
-                        # as well as update the optimizer lr in all param groups
-                        scheduler_cfg.scheduler.last_epoch -= 2
-                        scheduler_cfg.scheduler.step()
-
-                    # Removing the line below because it messes up train_valid_test_num_samples calculation.
-                    # self.trainer.fit_loop.max_steps = self.trainer.fit_loop.max_steps + 1
-
-                    # Reset the optimizer update skipped to `None` - this is to prevent scheduler no-ops during
-                    # accumulated gradient updates.
-                    grad_scaler.optimizer_update_skipped = None
+        grad_scaler = getattr(self, '_fp16_grad_scaler', None)
+        if grad_scaler is not None:
+            # If the grad scaler skipped its optimizer step due to infs/nans,
+            # decrement the step of all schedulers.
+            if grad_scaler.optimizer_update_skipped is not None and grad_scaler.optimizer_update_skipped is True:
+                scheduler_cfgs = self.trainer.lr_scheduler_configs
+
+                if not scheduler_cfgs or not self.trainer.lightning_module.automatic_optimization:
+                    return
+
+                for scheduler_cfg in scheduler_cfgs:
+                    # Decrement the counter by 2, then perform a scheduler.step() to perform a no-up
+                    # as well as update the optimizer lr in all param groups
+                    scheduler_cfg.scheduler.last_epoch -= 2
+                    scheduler_cfg.scheduler.step()
+
+                # Removing the line below because it messes up train_valid_test_num_samples calculation.
+                # self.trainer.fit_loop.max_steps = self.trainer.fit_loop.max_steps + 1
+
+                # Reset the optimizer update skipped to `None` - this is to prevent scheduler no-ops during
+                # accumulated gradient updates.
+                grad_scaler.optimizer_update_skipped = None
 
         if self.gc_interval > 0 and (self.trainer.global_step % self.gc_interval == 0):
             gc.collect()
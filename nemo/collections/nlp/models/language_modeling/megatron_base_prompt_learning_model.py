@@ -167,19 +167,23 @@ class MegatronBasePromptLearningModel(MegatronBaseModel, TextGeneration):
 
         task_id_num = 0
         for task in task_templates:
-            self.task_templates[task.taskname] = {
-                "prompt_template": task.prompt_template,
-                "prompt_template_fields": re.findall("\{(.*?)\}", task.prompt_template),
+            # resolve each OmegaConf node once instead of per-key below
+            taskname = task.taskname
+            prompt_template = task.prompt_template
+            total_virtual_tokens = task.total_virtual_tokens
+            self.task_templates[taskname] = {
+                "prompt_template": prompt_template,
+                "prompt_template_fields": re.findall("\{(.*?)\}", prompt_template),
                 "answer_only_loss": task.get("answer_only_loss", False),
                 "answer_field": task.get("answer_field", None),
                 "truncate_field": task.truncate_field,
-                "total_virtual_tokens": task.total_virtual_tokens,
+                "total_virtual_tokens": total_virtual_tokens,
                 "virtual_token_splits": task.virtual_token_splits,
                 "task_id_num": task_id_num,
             }
 
-            self.max_virtual_tokens = max(self.max_virtual_tokens, task.total_virtual_tokens)
-            self.task_id_num_to_name[task_id_num] = task.taskname
+            self.max_virtual_tokens = max(self.max_virtual_tokens, total_virtual_tokens)
+            self.task_id_num_to_name[task_id_num] = taskname
             task_id_num += 1
 
         # Check that all new tasks have the same total num virtual tokens
@@ -12,18 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import itertools
+import json
 import os
+import shutil
+import tempfile
 from functools import partial
 from typing import Any, List, Optional, Union
 
 import torch
 from omegaconf.dictconfig import DictConfig
-from omegaconf.omegaconf import open_dict
+from omegaconf.omegaconf import OmegaConf, open_dict
 from pytorch_lightning.trainer.trainer import Trainer
 
 from nemo.collections.common.tokenizers.sentencepiece_tokenizer import SentencePieceTokenizer
 from nemo.collections.nlp.data.language_modeling.megatron.gpt_prompt_learning_dataset import GPTPromptLearningDataset
+from nemo.collections.nlp.data.language_modeling.megatron.megatron_batch_samplers import (
+    MegatronPretrainingBatchSampler,
+    MegatronPretrainingRandomBatchSampler,
+)
 from nemo.collections.nlp.metrics.prompt_learning_metrics import AccuracyScore, BLEUScore, ROUGEScores
 from nemo.collections.nlp.models.language_modeling.megatron_base_prompt_learning_model import (
     MegatronBasePromptLearningModel,
@@ -70,6 +78,14 @@ except (ImportError, ModuleNotFoundError):
 __all__ = ['MegatronGPTPromptLearningModel']
 
 
+class _EpochAwareRandomBatchSampler(MegatronPretrainingRandomBatchSampler):
+    """Adds the ``set_epoch`` hook Lightning calls at each epoch boundary so
+    every epoch gets a fresh shuffle order, deterministic on resume."""
+
+    def set_epoch(self, epoch: int) -> None:
+        self.consumed_samples = epoch * (self.total_samples - self.last_batch_size)
+
+
 class MegatronGPTPromptLearningModel(MegatronBasePromptLearningModel):
     """
     Model class for prompt-tuning or p-tuning a pretrained Megatron GPT model. 
@@ -102,8 +118,18 @@ class MegatronGPTPromptLearningModel(MegatronBasePromptLearningModel):
         self.cfg = cfg
         self.config: ModelParallelConfig = self.model_parallel_config
         save_restore_connector = NLPSaveRestoreConnector()
+        extracted_dir = None
         if os.path.isdir(cfg.get('language_model_path')):
             save_restore_connector.model_extracted_dir = cfg.get('language_model_path')
+        else:
+            # Extract the .nemo archive once so both the config read below and the
+            # full restore further down reuse the extracted dir instead of each
+            # re-scanning the tar
+            extracted_dir = tempfile.mkdtemp()
+            save_restore_connector._unpack_nemo_file(
+                path2file=cfg.get('language_model_path'), out_folder=extracted_dir
+            )
+            save_restore_connector.model_extracted_dir = extracted_dir
         frozen_model_cfg = MegatronGPTModel.restore_from(
             cfg.get('language_model_path'),
             trainer=trainer,
@@ -136,7 +162,16 @@ class MegatronGPTPromptLearningModel(MegatronBasePromptLearningModel):
                 trainer=trainer,
                 save_restore_connector=save_restore_connector,
                 override_config_path=frozen_model_cfg,
-            ).to(dtype=self.autocast_dtype)
+            )
+
+        if extracted_dir is not None:
+            # the extracted .nemo contents are multi-GB and only needed for the
+            # two restore_from calls above
+            shutil.rmtree(extracted_dir, ignore_errors=True)
+
+        # The restored parameters are still on CPU here (the trainer moves the
+        # module to the device later), so this is a plain synchronous cast.
+        self.frozen_model = self.frozen_model.to(dtype=self.autocast_dtype)
 
         self.megatron_amp_O2 = self.cfg.get('megatron_amp_O2', False)
         self.pipeline_parallel = self.cfg.get('pipeline_model_parallel_size', 1) > 1
@@ -513,64 +548,94 @@ class MegatronGPTPromptLearningModel(MegatronBasePromptLearningModel):
         if self.cfg.get('transformer_engine', False) or self.cfg.get('mcore_gpt', False):
             self.frozen_model.setup_transformer_engine_tp_groups()
 
+    def _clipped_max_seq_length(self):
+        max_seq_length = self.frozen_model.cfg.encoder_seq_length
+        if "max_seq_length" in self.cfg.data and self.cfg.data.max_seq_length:
+            max_seq_length = min(self.cfg.data.max_seq_length, max_seq_length)
+        return max_seq_length
+
+    def _derive_cache_data_path(self, data, max_seq_length, add_bos, add_eos, for_train):
+        """Deterministic cache file keyed by the parameters that change the
+        tokenized examples, so repeat runs skip tokenization without the user
+        hand-managing per-split cache paths."""
+        cache_dir = self.cfg.data.get('cache_dir', None)
+        if cache_dir is None:
+            return None
+        params = {
+            'data': data,
+            'max_seq_length': max_seq_length,
+            'min_seq_length': self.cfg.data.get('min_seq_length', 1),
+            'add_bos': add_bos,
+            'add_eos': add_eos,
+            'for_train': for_train,
+            # the tokenizer and the prompt formatting also change the cached
+            # token ids, so key on them as well in case cache_dir is shared
+            # across models or configs
+            'language_model_path': self.cfg.get('language_model_path'),
+            'task_templates': OmegaConf.to_container(self.cfg.task_templates, resolve=True),
+        }
+        cache_key = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        # the dataset opens this path with 'wb'; make sure the directory exists
+        os.makedirs(cache_dir, exist_ok=True)
+        return os.path.join(cache_dir, cache_key + '.pkl')
+
+    def _build_virtual_prompt_split(self, data, batch_size, max_seq_length, for_train, drop_last, shuffle, cache_key):
+        # single code path for the kwargs shared by the train/val/test splits
+        add_bos = self.cfg.data.get('add_bos', False)
+        add_eos = self.cfg.data.get('add_eos', True)
+        cache_data_path = self.cfg.data.get(cache_key, None)
+        if cache_data_path is None:
+            cache_data_path = self._derive_cache_data_path(data, max_seq_length, add_bos, add_eos, for_train)
+        return self.build_virtual_prompt_dataset(
+            data=data,
+            batch_size=batch_size,
+            max_seq_length=max_seq_length,
+            min_seq_length=self.cfg.data.get('min_seq_length', 1),
+            add_bos=add_bos,
+            add_eos=add_eos,
+            for_train=for_train,
+            drop_last=drop_last,
+            shuffle=shuffle,
+            num_workers=self.cfg.data.num_workers,
+            pin_memory=True,
+            cache_data_path=cache_data_path,
+            load_cache=self.cfg.data.get('load_cache', False),
+        )
+
     def setup_training_data(self, training_data_config=None):
         if self.cfg.data.get('train_ds', None):
-            max_seq_length = self.frozen_model.cfg.encoder_seq_length
-            if "max_seq_length" in self.cfg.data and self.cfg.data.max_seq_length:
-                max_seq_length = min(self.cfg.data.max_seq_length, max_seq_length)
-            self._train_ds, self._train_dl = self.build_virtual_prompt_dataset(
+            self._train_ds, self._train_dl = self._build_virtual_prompt_split(
                 data=self.cfg.data.train_ds,
                 batch_size=self.cfg.global_batch_size,
-                max_seq_length=max_seq_length,
-                min_seq_length=self.cfg.data.get('min_seq_length', 1),
-                add_bos=self.cfg.data.get('add_bos', False),
-                add_eos=self.cfg.data.get('add_eos', True),
+                max_seq_length=self._clipped_max_seq_length(),
                 for_train=True,
                 drop_last=True,
                 shuffle=True,
-                num_workers=self.cfg.data.num_workers,
-                pin_memory=True,
-                cache_data_path=self.cfg.data.get('train_cache_data_path', None),
-                load_cache=self.cfg.data.get('load_cache', False),
+                cache_key='train_cache_data_path',
             )
 
     def setup_validation_data(self, validation_data_config=None):
         if self.cfg.data.get('validation_ds', None):
-            max_seq_length = self.frozen_model.cfg.encoder_seq_length
-            if "max_seq_length" in self.cfg.data and self.cfg.data.max_seq_length:
-                max_seq_length = min(self.cfg.data.max_seq_length, max_seq_length)
-            self._validation_ds, self._validation_dl = self.build_virtual_prompt_dataset(
+            self._validation_ds, self._validation_dl = self._build_virtual_prompt_split(
                 data=self.cfg.data.validation_ds,
                 batch_size=self.cfg.get('validation_global_batch_size', self.cfg.global_batch_size),
-                max_seq_length=max_seq_length,
-                min_seq_length=self.cfg.data.get('min_seq_length', 1),
-                add_bos=self.cfg.data.get('add_bos', False),
-                add_eos=self.cfg.data.get('add_eos', True),
+                max_seq_length=self._clipped_max_seq_length(),
                 for_train=True,
                 drop_last=self.cfg.get('validation_drop_last', True),
                 shuffle=False,
-                num_workers=self.cfg.data.num_workers,
-                pin_memory=True,
-                cache_data_path=self.cfg.data.get('validation_cache_data_path', None),
-                load_cache=self.cfg.data.get('load_cache', False),
+                cache_key='validation_cache_data_path',
             )
 
     def setup_test_data(self, test_data_config=None):
         if self.cfg.data.get('test_ds', None):
-            self._test_ds, self._test_dl = self.build_virtual_prompt_dataset(
+            self._test_ds, self._test_dl = self._build_virtual_prompt_split(
                 data=self.cfg.data.test_ds,
                 batch_size=self.cfg.get('validation_global_batch_size', self.cfg.global_batch_size),
                 max_seq_length=self.frozen_model.cfg.encoder_seq_length,
-                min_seq_length=self.cfg.data.get('min_seq_length', 1),
-                add_bos=self.cfg.data.get('add_bos', False),
-                add_eos=self.cfg.data.get('add_eos', True),
                 for_train=False,
                 drop_last=False,
                 shuffle=False,
-                num_workers=self.cfg.data.num_workers,
-                pin_memory=True,
-                cache_data_path=self.cfg.data.get('test_cache_data_path', None),
-                load_cache=self.cfg.data.get('load_cache', False),
+                cache_key='test_cache_data_path',
             )
 
     def build_virtual_prompt_dataset(
@@ -614,12 +679,38 @@ class MegatronGPTPromptLearningModel(MegatronBasePromptLearningModel):
         # Make distributed dataloader
         rank = parallel_state.get_data_parallel_rank()
         data_parallel_size = parallel_state.get_data_parallel_world_size()
-        sampler = torch.utils.data.distributed.DistributedSampler(
-            dataset, num_replicas=data_parallel_size, rank=rank, shuffle=shuffle, seed=self.cfg.seed
-        )
 
         assert batch_size % data_parallel_size == 0, "Global batch size must be evenly divisible by data parallel size"
 
+        # Megatron batch samplers slice their own rank's window instead of
+        # materializing a full-dataset index permutation in every worker the
+        # way DistributedSampler does
+        if shuffle and drop_last:
+            batch_sampler = _EpochAwareRandomBatchSampler(
+                total_samples=len(dataset),
+                consumed_samples=0,
+                micro_batch_size=batch_size // data_parallel_size,
+                global_batch_size=batch_size,
+                data_parallel_rank=rank,
+                data_parallel_size=data_parallel_size,
+                drop_last=drop_last,
+                seed=self.cfg.seed,
+            )
+        else:
+            # the random variant cannot serve a final partial batch, so this
+            # path also covers shuffle without drop_last; pad the partial batch
+            # to keep per-rank counts equal and eval collectives in sync
+            batch_sampler = MegatronPretrainingBatchSampler(
+                total_samples=len(dataset),
+                consumed_samples=0,
+                micro_batch_size=batch_size // data_parallel_size,
+                global_batch_size=batch_size,
+                data_parallel_rank=rank,
+                data_parallel_size=data_parallel_size,
+                drop_last=drop_last,
+                pad_samples_to_global_batch_size=not drop_last,
+            )
+
         if for_train:
             if self.cfg.get("sequence_parallel", False):
                 collate_fn = partial(
@@ -633,14 +724,14 @@ class MegatronGPTPromptLearningModel(MegatronBasePromptLearningModel):
         dataloader = torch.utils.data.DataLoader(
             dataset,
             collate_fn=collate_fn,
-            sampler=sampler,
-            batch_size=batch_size // data_parallel_size,
-            drop_last=drop_last,
+            batch_sampler=batch_sampler,
             num_workers=num_workers,
             pin_memory=pin_memory,
             persistent_workers=True
             if num_workers > 0
             else False,  # (@adithyare and @eharper) We need this to make spawn=True to work.
+            # stage batches ahead so the first batch of each epoch isn't blocking
+            prefetch_factor=2 if num_workers > 0 else None,
         )
 
         return dataset, dataloader
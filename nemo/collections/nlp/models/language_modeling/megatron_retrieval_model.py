@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import math
+import os
 from typing import Any, List, Optional, Union
 
 import torch
@@ -28,6 +29,7 @@ from nemo.collections.nlp.data.language_modeling.megatron.retro_dataset_legacy i
     build_train_valid_test_datasets,
 )
 from nemo.collections.nlp.models.language_modeling.megatron_base_model import MegatronBaseModel
+from nemo.collections.nlp.modules.common.megatron.attention import CoreAttention
 from nemo.collections.nlp.modules.common.megatron.module import Float16Module
 from nemo.collections.nlp.modules.common.megatron.mup.init import normal_
 from nemo.collections.nlp.modules.common.megatron.mup.shape import set_base_shapes
@@ -71,6 +73,22 @@ except (ImportError, ModuleNotFoundError):
 __all__ = ["MegatronRetrievalModel"]
 
 
+@torch.jit.script
+def _masked_mean_loss(loss: torch.Tensor, loss_mask: torch.Tensor) -> torch.Tensor:
+    """Masked mean over token losses as a single fused dot-product reduction,
+    instead of an elementwise multiply plus two separate sums. The mask is read
+    in the loss dtype to halve its bandwidth under fp16/bf16; only the reduced
+    scalar is upcast to fp32."""
+    mask = loss_mask.to(loss.dtype).flatten()
+    return (torch.dot(loss.flatten(), mask) / mask.sum()).float()
+
+
+def _forward_output_id_func(output_tensor):
+    # module-level so token-by-token generation doesn't allocate a fresh
+    # closure per forward call
+    return output_tensor, {'logits': output_tensor}
+
+
 class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
     """
     Megatron Retrieval enhanced language model
@@ -95,6 +113,12 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
                 config=self.model_parallel_config, module=self.model, precision=self.cfg.precision
             )
 
+        if self.cfg.get('use_torch_compile', False):
+            # seq_length and chunk_size are fixed per run, so shapes stay static
+            # and Inductor can fuse the attention/MLP elementwise chains without
+            # recompiling; fullgraph is off since the pipeline helpers graph-break
+            self.model = torch.compile(self.model, mode='reduce-overhead', fullgraph=False)
+
         # self.setup_optimizer_param_groups()
         self.model.model_type = ModelType.encoder_and_decoder
 
@@ -102,47 +126,55 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
             True if (not self.megatron_amp_O2) and (self.autocast_dtype in [torch.float16, torch.bfloat16]) else False
         )
 
+        # position ids are recomputed every step otherwise; cache per (seq_len, device)
+        self._position_ids_cache = {}
+        # OmegaConf get() traverses the config tree, so cache hot-path flags once
+        self._add_position_embedding = self.cfg.get('add_position_embedding', False)
+        # set when async grad allreduce work must complete before the weight update
+        self._needs_grad_sync = False
+        # on-device running loss over the gradient-accumulation window
+        self._reduced_loss_accum = None
+        self._reduced_loss_count = 0
+        # gradient-accumulation divisor, snapshotted in on_train_start so the
+        # per-step boundary check avoids the trainer property chain
+        self._accumulate_grad_batches = 1
+        # generation forward closure, built lazily and reused across tokens
+        self._fwd_output_only_func = None
+
         if hasattr(self.cfg, "shape_file"):
             set_base_shapes(self, self.register_artifact("shape_file", self.cfg.shape_file), rescale_params=False)
 
             # here manually initialize all the named parameters with the muTranfer normal initializer
+            # muP scales every tensor by its own infshape width multiplier, so the init
+            # calls stay per-tensor; the std()/mean() sanity checks each force a D2H
+            # sync per parameter and are therefore gated behind NEMO_INIT_CHECK
+            init_check = os.environ.get("NEMO_INIT_CHECK", "0") == "1"
+            # std for the output dense matrix weight, matching the megatron lm model
+            dense_output_std = self.cfg.init_method_std / math.sqrt(2.0 * 12.0)
             for name, tensor in self.named_parameters():
                 if name.endswith('.dense_4h_to_h.weight') or name.endswith('.dense.weight'):
                     # initialize all the output dense matrix weight
-                    # match the megatron lm model
-                    std = self.cfg.init_method_std / math.sqrt(2.0 * 12.0)
-                    normal_(tensor, 0, std)
+                    normal_(tensor, 0, dense_output_std)
                 elif name.endswith('layernorm.weight'):
                     # initialize all the layer norm weight
-                    if tensor.std() != 0 and tensor.mean() != 1:
+                    if init_check and tensor.std() != 0 and tensor.mean() != 1:
                         raise ValueError(f'need to check {name} init')
                     normal_(tensor, 1, 0)
                 elif name.endswith('.weight'):
                     # initialize all the other dense matrix weight
                     normal_(tensor, 0, self.cfg.init_method_std)
                 else:
-                    if tensor.std() != 0 and tensor.mean() != 0:
+                    if init_check and tensor.std() != 0 and tensor.mean() != 0:
                         raise ValueError(f'need to check {name} init')
 
             # here manually overwrite the norm factor
             # note, has to turn off the model.apply_query_key_layer_scaling
             assert not self.cfg.apply_query_key_layer_scaling
-            for name, layer in self.named_modules():
-                if (
-                    name.endswith('.self_attention')
-                    or name.endswith('.inter_attention')
-                    or name.endswith('.cross_attention')
-                    or name.endswith('.core_attention')
-                ):
-                    if hasattr(layer, 'norm_factor') and hasattr(layer, 'hidden_size_per_attention_head'):
-                        layer.norm_factor = (
-                            layer.hidden_size_per_attention_head / 8.0
-                        )  # divide 8 to make it consist with ADLR setting
-                else:
-                    if hasattr(layer, 'norm_factor') or hasattr(layer, 'hidden_size_per_attention_head'):
-                        logging.error(
-                            f'module {name} has norm factor but its name is not ending with attention, need to double check'
-                        )
+            for layer in self.modules():
+                if isinstance(layer, CoreAttention):
+                    layer.norm_factor = (
+                        layer.hidden_size_per_attention_head / 8.0
+                    )  # divide 8 to make it consist with ADLR setting
 
     def _build_tokenizer(self):
         self.tokenizer = get_nmt_tokenizer(
@@ -201,9 +233,12 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
             chunk_size=self.cfg.get('chunk_size', 64),  # the chunk size used to retrive
             enc_num_layers=self.cfg.get('enc_num_layers', 4),  # total number of encoder layers
             dec_num_layers=self.cfg.get('dec_num_layers', 6),  # total number of decoder layers
-            enc_cross_attention=self.cfg.get('enc_cross_attention', [3]),  # layer numbers for cross attention
-            dec_cross_attention=self.cfg.get(
-                'dec_cross_attention', [3, 5]
+            # frozensets so the per-layer membership tests below are O(1)
+            enc_cross_attention=frozenset(
+                self.cfg.get('enc_cross_attention', [3])
+            ),  # layer numbers for cross attention
+            dec_cross_attention=frozenset(
+                self.cfg.get('dec_cross_attention', [3, 5])
             ),  # layer numbers for chunked cross attention
             add_position_embedding=self.cfg.get(
                 'add_position_embedding', False
@@ -238,15 +273,24 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
         )
         return output_tensor
 
-    def training_step(self, batch, batch_idx):
+    def _get_position_ids(self, input_tokens_id):
+        """Build position ids once per (seq_len, device) and expand (view, no copy)
+        to the current batch instead of launching a kernel every step."""
+        key = (input_tokens_id.shape[1], input_tokens_id.device)
+        if self._position_ids_cache.get('key') != key:
+            self._position_ids_cache = {'key': key, 'ids': build_position_ids(input_tokens_id[:1])}
+        return self._position_ids_cache['ids'].expand(input_tokens_id.shape[0], -1)
+
+    def _shared_step(self, batch):
+        """Forward + masked-mean loss path shared by training and validation."""
         input_tokens_id = batch['tokens']
         input_attn_mask = batch['tokens_mask']
         loss_mask = batch['loss_mask']
         retrieved_ids = batch['retrieved_ids']
         retrieved_attn_mask = batch['retrieved_emb_mask']
         labels = batch['labels']
-        if self.cfg.get('add_position_embedding', False):
-            input_position_ids = build_position_ids(input_tokens_id)
+        if self._add_position_embedding:
+            input_position_ids = self._get_position_ids(input_tokens_id)
         else:
             input_position_ids = None
         loss = self(
@@ -257,10 +301,21 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
             labels=labels,
             position_ids=input_position_ids,
         )
-        loss_mask = loss_mask.float()
-        lm_loss = torch.sum(loss.view(-1) * loss_mask.reshape(-1)) / loss_mask.sum()
+        return _masked_mean_loss(loss, loss_mask)
+
+    def on_train_start(self):
+        super().on_train_start()
+        self._accumulate_grad_batches = int(self.trainer.accumulate_grad_batches)
+
+    def training_step(self, batch, batch_idx):
+        lm_loss = self._shared_step(batch)
         reduced_loss = average_losses_across_data_parallel_group([lm_loss])
-        self._reduced_loss_buffer.append(reduced_loss[0])
+        # accumulate on device; a Python list of CUDA tensors would sync on the sum
+        if self._reduced_loss_accum is None:
+            self._reduced_loss_accum = reduced_loss[0].detach().clone()
+        else:
+            self._reduced_loss_accum += reduced_loss[0].detach()
+        self._reduced_loss_count += 1
 
         if self.torch_dtype == torch.float16:
             loss_scale = self.trainer.precision_plugin.scaler._scale
@@ -274,8 +329,10 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
             # while async grad allreduce is enabled, bprop will keep moving forward without waiting for
             # the finish of async grad AR works. Hence, to guarantee the correctness of grads reduction,
             # we cannot start weight update until all async grad AR works are done.
+            # The sync itself is deferred to on_before_optimizer_step so the CPU-side
+            # logging below overlaps with the in-flight allreduce work.
             if self.cfg.get('pipeline_model_parallel_size', 1) == 1:
-                torch.cuda.synchronize()
+                self._needs_grad_sync = True
             # when using pipeline parallelism grads must be reduced after the pipeline (not asynchronously)
             if self.cfg.get('pipeline_model_parallel_size', 1) > 1:
                 # main grads are stored in the MainParamsOptimizer wrapper
@@ -286,41 +343,31 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
             # self.allreduce_gradients()  # @sangkug we think this is causing memory to blow up (hurts perf)
             pass
 
-        if (batch_idx + 1) % self.trainer.accumulate_grad_batches == 0:
+        if self._reduced_loss_count == self._accumulate_grad_batches:
             # Reduced loss for logging.
-            average_reduced_loss = sum(self._reduced_loss_buffer) / len(self._reduced_loss_buffer)
+            average_reduced_loss = self._reduced_loss_accum / self._reduced_loss_count
             self.log('reduced_train_loss', average_reduced_loss, prog_bar=True, batch_size=1)
-            lr = self._optimizer.param_groups[0]['lr']
-            self.log('lr', lr, batch_size=1)
+            param_group = self._optimizer.param_groups[0]
+            self.log('lr', param_group['lr'], batch_size=1)
             self.log('global_step', self.trainer.global_step, prog_bar=True, batch_size=1)
             self.log(
                 'consumed_samples', self._compute_consumed_samples_after_training_step(), prog_bar=True, batch_size=1,
             )
-            self._reduced_loss_buffer = []
+            self._reduced_loss_accum = None
+            self._reduced_loss_count = 0
         return lm_loss
 
+    def on_before_optimizer_step(self, optimizer):
+        # wait for async grad allreduce only when the weight update is imminent,
+        # instead of blocking at the end of backward
+        if self._needs_grad_sync:
+            torch.cuda.synchronize()
+            self._needs_grad_sync = False
+        super().on_before_optimizer_step(optimizer)
+
     def validation_step(self, batch, batch_idx):
         prefix = "test" if self.trainer.testing else "val"
-        input_tokens_id = batch['tokens']
-        input_attn_mask = batch['tokens_mask']
-        loss_mask = batch['loss_mask']
-        retrieved_ids = batch['retrieved_ids']
-        retrieved_attn_mask = batch['retrieved_emb_mask']
-        labels = batch['labels']
-        if self.cfg.get('add_position_embedding', False):
-            input_position_ids = build_position_ids(input_tokens_id)
-        else:
-            input_position_ids = None
-        loss = self(
-            input_tokens_id,
-            input_attn_mask,
-            retrieved_ids,
-            retrieved_attn_mask,
-            labels=labels,
-            position_ids=input_position_ids,
-        )
-        loss_mask = loss_mask.float()
-        lm_loss = torch.sum(loss.view(-1) * loss_mask.reshape(-1)) / loss_mask.sum()
+        lm_loss = self._shared_step(batch)
         reduced_loss = average_losses_across_data_parallel_group([lm_loss])
         if prefix == 'val':
             self.validation_step_outputs.append(reduced_loss)
@@ -331,11 +378,11 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
     def on_validation_epoch_end(self):
         if len(self.validation_step_outputs) == 0:
             return None
-        averaged_loss = torch.stack(self.validation_step_outputs).mean()
+        averaged_loss = torch.stack(self.validation_step_outputs).mean().item()
         self.log('val_loss', averaged_loss, prog_bar=True, batch_size=1)
         # formula to compute the perplexity
         # https://towardsdatascience.com/the-relationship-between-perplexity-and-entropy-in-nlp-f81888775ccc
-        self.log('perplexity', torch.exp(averaged_loss), prog_bar=True, batch_size=1)
+        self.log('perplexity', math.exp(averaged_loss), prog_bar=True, batch_size=1)
         self.validation_step_outputs.clear()  # free memory
         return averaged_loss
 
@@ -343,10 +390,10 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
         return self.validation_step(batch, batch_idx)
 
     def on_test_epoch_end(self):
-        averaged_loss = torch.stack(self.test_step_outputs).mean()
+        averaged_loss = torch.stack(self.test_step_outputs).mean().item()
         self.log('test_loss', averaged_loss, prog_bar=True, batch_size=1)
         logging.info(f'test_loss: {averaged_loss} ')
-        self.log('perplexity', torch.exp(averaged_loss), prog_bar=True, batch_size=1)
+        self.log('perplexity', math.exp(averaged_loss), prog_bar=True, batch_size=1)
         self.test_step_outputs.clear()  # free memory
         return averaged_loss
 
@@ -501,12 +548,25 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
         if length_params is None:
             length_params = get_default_length_params()
 
-        return megatron_gpt_generate(self.cuda(), inputs, self.tokenizer, length_params, sampling_params, **args)
+        # self.cuda() walks the whole module tree; only pay that once
+        if not getattr(self, '_placed_on_cuda', False):
+            if next(self.parameters()).device.type != 'cuda':
+                self.cuda()
+            self._placed_on_cuda = True
+
+        return megatron_gpt_generate(self, inputs, self.tokenizer, length_params, sampling_params, **args)
 
     def get_forward_output_only_func(self):
         """
         Used for generate method only.
         """
+        # the strategy's forward_step calls this once per generated token;
+        # build the closure once and hand back the same object. The retrieval
+        # branch inside stays data-dependent because neighbors can be flipped
+        # mid-session through the strategy's update_neighbors, so specializing
+        # a no-retrieval variant per session would go stale.
+        if self._fwd_output_only_func is not None:
+            return self._fwd_output_only_func
 
         def fwd_output_only_func(dataloader_iter, model):
             batch = next(dataloader_iter)
@@ -526,8 +586,10 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
                 retrieved = None
                 retrieved_mask = None
             else:
-                retrieved = retrieved.cuda()
-                retrieved_mask = retrieved_mask.cuda()
+                # async copies so pinned host tensors overlap with in-flight kernels;
+                # no-ops when the strategy already staged them on device
+                retrieved = retrieved.to(torch.cuda.current_device(), non_blocking=True)
+                retrieved_mask = retrieved_mask.to(torch.cuda.current_device(), non_blocking=True)
 
             extra_arg['set_inference_key_value_memory'] = set_inference_key_value_memory[0].item()
             extra_arg['inference_max_sequence_len'] = inference_max_sequence_len[0].item()
@@ -536,11 +598,9 @@ class MegatronRetrievalModel(MegatronBaseModel, TextGeneration):
 
             output_tensor = model(tokens, attention_mask, retrieved, retrieved_mask, **extra_arg)
 
-            def id_func(output_tensor):
-                return output_tensor, {'logits': output_tensor}
-
-            return output_tensor, id_func
+            return output_tensor, _forward_output_id_func
 
+        self._fwd_output_only_func = fwd_output_only_func
         return fwd_output_only_func
 
     def setup_training_data(self, cfg):
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 import torch
@@ -56,42 +58,36 @@ def build_all_datasets(
        There is one to one mapping between data_prefix and knn_map_path.
        Currently only supports one retrieval dataset.
     """
-    train_dataset = RetroQAFineTuneDataset(
-        cfg.train_ds.get('file_name'),
-        tokenizer,
-        cfg.train_ds.get('answer_only_loss'),
-        tokenizer.pad_id,
-        cfg.train_ds.get('seq_length'),
-        cfg.train_ds.get('add_bos'),
-        cfg.train_ds.get('add_eos'),
-        train_valid_test_num_samples[0],
-        cfg.train_ds.get('seed'),
-        cfg.train_ds.get('neighbors'),
-    )
-    val_dataset = RetroQAFineTuneDataset(
-        cfg.val_ds.get('file_name'),
-        tokenizer,
-        cfg.val_ds.get('answer_only_loss'),
-        tokenizer.pad_id,
-        cfg.val_ds.get('seq_length'),
-        cfg.val_ds.get('add_bos'),
-        cfg.val_ds.get('add_eos'),
-        train_valid_test_num_samples[1],
-        cfg.val_ds.get('seed'),
-        cfg.val_ds.get('neighbors'),
-    )
-    test_dataset = RetroQAFineTuneDataset(
-        cfg.test_ds.get('file_name'),
-        tokenizer,
-        cfg.test_ds.get('answer_only_loss'),
-        tokenizer.pad_id,
-        cfg.test_ds.get('seq_length'),
-        cfg.test_ds.get('add_bos'),
-        cfg.test_ds.get('add_eos'),
-        train_valid_test_num_samples[2],
-        cfg.test_ds.get('seed'),
-        cfg.test_ds.get('neighbors'),
-    )
+
+    def _build_dataset(ds_cfg, num_samples):
+        return RetroQAFineTuneDataset(
+            ds_cfg.get('file_name'),
+            tokenizer,
+            ds_cfg.get('answer_only_loss'),
+            tokenizer.pad_id,
+            ds_cfg.get('seq_length'),
+            ds_cfg.get('add_bos'),
+            ds_cfg.get('add_eos'),
+            num_samples,
+            ds_cfg.get('seed'),
+            ds_cfg.get('neighbors'),
+        )
+
+    split_args = list(zip((cfg.train_ds, cfg.val_ds, cfg.test_ds), train_valid_test_num_samples))
+
+    # escape hatch for storage that degrades under concurrent reads
+    if cfg.get('sequential_init', False):
+        train_dataset, val_dataset, test_dataset = [
+            _build_dataset(ds_cfg, num_samples) for ds_cfg, num_samples in split_args
+        ]
+        return train_dataset, val_dataset, test_dataset
+
+    # The three splits are independent and their build time is dominated by
+    # file I/O and mmap page-in, which release the GIL, so build them in
+    # parallel.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(_build_dataset, ds_cfg, num_samples) for ds_cfg, num_samples in split_args]
+        train_dataset, val_dataset, test_dataset = [future.result() for future in futures]
 
     return train_dataset, val_dataset, test_dataset
 
@@ -142,6 +138,19 @@ class MegatronRetroFinetuneModel(MegatronRetrievalModel):
             data_parallel_size=parallel_state.get_data_parallel_world_size(),
             drop_last=True,
         )
+        # Collate in background workers so batch preparation overlaps with
+        # forward/backward instead of running serially on the training thread.
+        num_workers = self.cfg.data.get('num_workers', None)
+        if num_workers is None:
+            # cap the derived default; collate is cheap enough that more than a
+            # handful of workers just burns memory on high-core-count nodes
+            num_workers = min(8, max(2, (os.cpu_count() or 2) // parallel_state.get_data_parallel_world_size()))
         return torch.utils.data.DataLoader(
-            dataset, batch_sampler=batch_sampler, collate_fn=collate_fn, num_workers=0, pin_memory=True,
+            dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=collate_fn,
+            num_workers=num_workers,
+            pin_memory=True,
+            persistent_workers=num_workers > 0,
+            prefetch_factor=2 if num_workers > 0 else None,
         )
@@ -25,6 +25,25 @@ try:
 except (ImportError, ModuleNotFoundError):
     HAVE_APEX = False
 
+try:
+    from apex.transformer.functional.fused_softmax import GenericScaledMaskedSoftmax
+
+    HAVE_GENERIC_FUSED_SOFTMAX = True
+
+except (ImportError, ModuleNotFoundError):
+    HAVE_GENERIC_FUSED_SOFTMAX = False
+
+
+@torch.jit.script
+def _jit_scale_mask_softmax(input: torch.Tensor, mask: torch.Tensor, scale: float) -> torch.Tensor:
+    """TorchScript-fused scale + mask + softmax for the eager fallback path,
+    matching attention_mask_func and the all-masked-row zeroing of
+    MatchedScaleMaskSoftmax."""
+    probs = torch.softmax(input.mul(scale).masked_fill(mask, -10000.0), dim=-1)
+    all_k_masked = mask.all(dim=-1)
+    zero_attention_mask = (1.0 - all_k_masked.to(probs.dtype)).unsqueeze(-1)
+    return probs * zero_attention_mask
+
 if HAVE_APEX:
 
     class MatchedScaleMaskSoftmax(FusedScaleMaskSoftmax):
@@ -43,7 +62,28 @@ if HAVE_APEX:
             scale: scaling factor used in input tensor scaling.
         """
 
+        def forward(self, input, mask):
+            # When fusion is requested but the specialized kernel cannot handle the
+            # shape (e.g. sequence lengths outside its supported range), fall back to
+            # apex's generic fused kernel instead of the unfused torch path, keeping
+            # scale + mask + softmax in a single kernel.
+            if (
+                HAVE_GENERIC_FUSED_SOFTMAX
+                and self.scaled_masked_softmax_fusion
+                and self.input_in_float16
+                and mask is not None
+                and not self.is_kernel_available(mask, *input.size())
+            ):
+                scale = self.scale if self.scale is not None else 1.0
+                return GenericScaledMaskedSoftmax.apply(input, mask, scale)
+            return super().forward(input, mask)
+
         def forward_torch_softmax(self, input, mask):
+            # When no dtype round-trip is needed, let TorchScript fuse the
+            # scale/mask/softmax chain instead of running three eager kernels
+            if mask is not None and self.scale is not None and not (self.input_in_float16 and self.softmax_in_fp32):
+                return _jit_scale_mask_softmax(input, mask, float(self.scale))
+
             if self.input_in_float16 and self.softmax_in_fp32:
                 input = input.float()
 
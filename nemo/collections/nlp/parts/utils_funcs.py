@@ -40,18 +40,26 @@ from nemo.collections.nlp.modules.common.megatron.utils import squared_relu
 from nemo.utils import logging
 
 
+_PRECISION_DTYPES = {
+    'bf16': torch.bfloat16,
+    'bf16-mixed': torch.bfloat16,
+    16: torch.float16,
+    '16': torch.float16,
+    '16-mixed': torch.float16,
+    32: torch.float32,
+    '32': torch.float32,
+    '32-true': torch.float32,
+}
+
+
 def torch_dtype_from_precision(precision: Union[int, str], megatron_amp_O2: Optional[bool] = None) -> torch.dtype:
     """ Mapping from PTL precision types to corresponding PyTorch parameter datatype."""
     if megatron_amp_O2 is not None and megatron_amp_O2 is False:
         return torch.float32
 
-    if precision in ['bf16', 'bf16-mixed']:
-        return torch.bfloat16
-    elif precision in [16, '16', '16-mixed']:
-        return torch.float16
-    elif precision in [32, '32', '32-true']:
-        return torch.float32
-    else:
+    try:
+        return _PRECISION_DTYPES[precision]
+    except KeyError:
         raise ValueError(f"Could not parse the precision of `{precision}` to a valid torch.dtype")
 
 